@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import os
+import csv
 import argparse
+import numpy as np
 import pandas as pd
-import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from jobgen import generate_jobs_from_excel
+from jobgen import generate_jobs
+from exporter import write_xlsx
 
 # ─── CONFIG ────────────────────────────────────────────────────────────────
 # NOTE: These paths are relative to the project root.
@@ -15,25 +18,68 @@ MPP_FILE        = os.path.join(INPUT_DIR, "MPP Data 13 Easels.csv")
 BOM_FILE        = os.path.join(INPUT_DIR, "Easel Components BOM.csv")
 SLICED_FILE     = os.path.join(INPUT_DIR, "Sliced Build Generated.xlsx")
 JOBS_OUTPUT_CSV = os.path.join(OUTPUT_DIR, "Jobs_Output.csv")
+# Format of Overall_Due_Date in the MPP export. A fixed format skips pandas'
+# per-file format inference; set to None to fall back to inference.
+DUE_DATE_FORMAT = "%Y-%m-%d"
 # ────────────────────────────────────────────────────────────────────────────
 
-def build_sliced_build_ID(mpp_path: str, bom_path: str, out_path: str):
-    # 1. Load and normalize source sheets
-    df_mpp = pd.read_csv(mpp_path, parse_dates=['Overall_Due_Date'])
-    df_mpp.columns = [c.strip().replace(' ', '_') for c in df_mpp.columns]
-    df_bom = pd.read_csv(bom_path)
-    # Normalize BOM column names
-    df_bom.columns = [c.strip().replace(' ', '_') for c in df_bom.columns]
-    # Normalize SKU formatting: convert dashes to underscores to match MPP
-    df_bom['Product_SKU'] = df_bom['Product_SKU'].str.replace('-', '_')
-    # If BOM lacks Product_SKU, but MPP has exactly one SKU, inject it
-    if 'Product_SKU' not in df_bom.columns:
+# Columns the build actually reads (matched after header normalization), plus
+# explicit MPP dtypes so read_csv can skip its dtype-inference pass.
+MPP_COLUMNS = ['MPP_Item_ID', 'Product_SKU', 'Overall_Due_Date', 'Status', 'Project_Phase']
+MPP_DTYPES  = {'MPP_Item_ID': str, 'Product_SKU': str, 'Status': 'category', 'Project_Phase': 'category'}
+BOM_COLUMNS = ['Product_SKU', 'Part_Name', 'Print_Quantity', 'Alpha_Quantity_on_Plate',
+               'Duration', 'Printing_Method', 'Required_Material_ID']
+
+SLICED_COLUMNS = ['Sliced Build ID', 'Quantity of Runs', 'Alpha Quantity on Plate', 'Estimated Print Time Minutes',
+                  'Required Material ID', 'Technology', 'Status', 'Created Timestamp']
+
+
+def _normalize_header(c: str) -> str:
+    return c.strip().replace(' ', '_')
+
+def _read_normalized_csv(path: str, columns, dtypes=None, date_columns=(), **kwargs) -> pd.DataFrame:
+    # usecols/dtype/parse_dates must name the file's raw headers, so map the
+    # normalized names back through the header row first (e.g. "Project Phase"
+    # still gets its Project_Phase dtype); columns come back normalized
+    raw = {_normalize_header(c): c for c in pd.read_csv(path, nrows=0).columns}
+    df = pd.read_csv(path,
+                     usecols=[raw[c] for c in columns if c in raw],
+                     dtype={raw[c]: t for c, t in (dtypes or {}).items() if c in raw},
+                     parse_dates=[raw[c] for c in date_columns if c in raw],
+                     **kwargs)
+    df.columns = [_normalize_header(c) for c in df.columns]
+    return df
+
+def write_sliced_build(df: pd.DataFrame, out_path: str):
+    # Parquet keeps dtypes and is far cheaper to round-trip than xlsx; use it
+    # whenever the consumer is another pipeline stage rather than a person.
+    if out_path.lower().endswith('.parquet'):
+        df.to_parquet(out_path, index=False)
+    else:
+        write_xlsx(df, out_path)
+
+
+def build_sliced_build_ID_df(mpp_path: str, bom_path: str) -> pd.DataFrame:
+    # One timestamp for the whole batch build, shared by every output row
+    created_ts = datetime.now().isoformat()
+
+    # 1. Load and normalize source sheets (both reads run concurrently; the parser
+    #    releases the GIL while tokenizing)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        f_mpp = pool.submit(_read_normalized_csv, mpp_path, MPP_COLUMNS, dtypes=MPP_DTYPES,
+                            date_columns=['Overall_Due_Date'], date_format=DUE_DATE_FORMAT, cache_dates=True)
+        f_bom = pool.submit(_read_normalized_csv, bom_path, BOM_COLUMNS)
+        df_mpp, df_bom = f_mpp.result(), f_bom.result()
+    if 'Product_SKU' in df_bom.columns:
+        # Normalize SKU formatting: convert dashes to underscores to match MPP
+        df_bom['Product_SKU'] = df_bom['Product_SKU'].str.replace('-', '_')
+    else:
+        # If BOM lacks Product_SKU, but MPP has exactly one SKU, inject it
         unique_skus = df_mpp['Product_SKU'].unique()
         if len(unique_skus) == 1:
             df_bom['Product_SKU'] = unique_skus[0]
         else:
             raise KeyError("BOM missing 'Product_SKU' column and multiple SKUs found in MPP")
-    df_bom.columns = [c.strip().replace(' ', '_') for c in df_bom.columns]
 
     # 2. Merge BOM template → MPP orders on Product_SKU
     df = df_bom.merge(
@@ -41,35 +87,59 @@ def build_sliced_build_ID(mpp_path: str, bom_path: str, out_path: str):
         on='Product_SKU',
         how='inner'
     )
+    # Low-cardinality strings repeated on every run: store them as categoricals so the
+    # explode below repeats small integer codes instead of Python string objects
+    for col in ('Printing_Method', 'Required_Material_ID', 'Status', 'Project_Phase'):
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    # Parse Duration once per merged row rather than once per exploded run
+    df['Estimated_Print_Time_Minutes'] = (pd.to_timedelta(df['Duration']).dt.total_seconds() // 60).astype(np.int64)
 
     # 3. Compute runs (vectorized): ceil(Print_Quantity / Alpha_Quantity_on_Plate)
-    ratio = df['Print_Quantity'] / df['Alpha_Quantity_on_Plate']
-    df['Number_of_Runs'] = ratio.apply(math.ceil).astype(int)
-
-    # 4. Explode into slice-build rows
-    rows = []
-    for _, r in df.iterrows():
-        for run in range(1, r['Number_of_Runs'] + 1):
-            rows.append({
-                'Sliced Build ID': f"{r['MPP_Item_ID']}–{r['Part_Name']}_R{run}",
-                'Quantity of Runs': r['Number_of_Runs'],
-                'Alpha Quantity on Plate': r['Alpha_Quantity_on_Plate'],
-                'Estimated Print Time Minutes': int(pd.to_timedelta(r['Duration']).total_seconds() / 60),
-                'Required Material ID': r.get('Required_Material_ID', ''),
-                'Technology': r['Printing_Method'],
-                'Status': 'Queued',
-                'Created Timestamp': datetime.now().isoformat()
-            })
-# 5. Write to Excel for downstream consumption
-    pd.DataFrame(rows).to_excel(out_path, index=False)
-    print(f"✅ Sliced build sheet written to {out_path} ({len(rows)} rows)")
+    #    Integer columns use an exact integer ceil; anything else falls back to np.ceil.
+    pq = df['Print_Quantity'].to_numpy()
+    aq = df['Alpha_Quantity_on_Plate'].to_numpy()
+    if np.issubdtype(pq.dtype, np.integer) and np.issubdtype(aq.dtype, np.integer):
+        df['Number_of_Runs'] = ((pq + aq - 1) // aq).astype(np.int64)
+    else:
+        df['Number_of_Runs'] = np.ceil(pq / aq).astype(np.int64)
+
+    # 4. Explode into slice-build rows: repeat each row Number_of_Runs times and
+    #    number the copies 1..Number_of_Runs within each original row
+    #    (run index = position in the expanded frame minus the parent's start offset)
+    runs = df['Number_of_Runs'].to_numpy()
+    exp = df.iloc[np.repeat(np.arange(len(df)), runs)].reset_index(drop=True)
+    exp['run'] = np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs) + 1
+
+    # 5. Shape the output columns in place on the exploded frame
+    exp['Sliced Build ID'] = exp['MPP_Item_ID'].astype(str) + '–' + exp['Part_Name'].astype(str) + '_R' + exp['run'].astype(str)
+    exp = exp.rename(columns={
+        'Number_of_Runs': 'Quantity of Runs',
+        'Alpha_Quantity_on_Plate': 'Alpha Quantity on Plate',
+        'Estimated_Print_Time_Minutes': 'Estimated Print Time Minutes',
+        'Required_Material_ID': 'Required Material ID',
+        'Printing_Method': 'Technology',
+    })
+    if 'Required Material ID' not in exp.columns:
+        exp['Required Material ID'] = ''
+    exp['Status'] = 'Queued'
+    exp['Created Timestamp'] = created_ts
+    return exp[SLICED_COLUMNS]
+
+
+def build_sliced_build_ID(mpp_path: str, bom_path: str, out_path: str) -> pd.DataFrame:
+    out = build_sliced_build_ID_df(mpp_path, bom_path)
+    # 6. Persist for downstream consumption (.xlsx by default, .parquet if requested)
+    write_sliced_build(out, out_path)
+    print(f"✅ Sliced build sheet written to {out_path} ({len(out)} rows)")
+    return out
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generate a sliced build sheet from MPP and BOM data.")
     parser.add_argument('--mpp', type=str, default=MPP_FILE, help=f'Path to the MPP data CSV file. Default: {MPP_FILE}')
     parser.add_argument('--bom', type=str, default=BOM_FILE, help=f'Path to the BOM data CSV file. Default: {BOM_FILE}')
-    parser.add_argument('--sliced-out', type=str, default=SLICED_FILE, help=f'Path for the output sliced build Excel file. Default: {SLICED_FILE}')
+    parser.add_argument('--sliced-out', type=str, default=SLICED_FILE, help=f'Path for the output sliced build file (.xlsx or .parquet); pass "" to skip writing it. Default: {SLICED_FILE}')
     parser.add_argument('--jobs-out', type=str, default=JOBS_OUTPUT_CSV, help=f'Path for the output jobs CSV file. Default: {JOBS_OUTPUT_CSV}')
     
     args = parser.parse_args()
@@ -80,22 +150,29 @@ def main():
             print(f"❌ Error: Required input file not found at '{f}'. Halting execution.")
             return
 
-    # Step 1: build the sliced-build file
+    # Step 1: build the sliced-build sheet in memory
     print(f"Building sliced build sheet from {args.mpp} and {args.bom}...")
-    build_sliced_build_ID(args.mpp, args.bom, args.sliced_out)
+    df_sliced = build_sliced_build_ID_df(args.mpp, args.bom)
 
-    # Step 2: feed that file into your existing generator
-    jobs = generate_jobs_from_excel(args.sliced_out)
+    # Step 2: hand the frame straight to the job generator (no file round-trip),
+    # writing the sheet in the background meanwhile; neither step mutates df_sliced
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        write_future = pool.submit(write_sliced_build, df_sliced, args.sliced_out) if args.sliced_out else None
+        jobs = generate_jobs(df_sliced)
+        if write_future is not None:
+            write_future.result()
+            print(f"✅ Sliced build sheet written to {args.sliced_out} ({len(df_sliced)} rows)")
 
     # Step 3: optionally persist jobs to CSV
     if jobs:
         # Ensure output directory exists
         os.makedirs(os.path.dirname(args.jobs_out) or '.', exist_ok=True)
+        # All jobs share one schema: write the header once, then plain value lists
+        fieldnames = list(jobs[0].keys())
         with open(args.jobs_out, 'w', newline='') as f:
-            import csv
-            writer = csv.DictWriter(f, fieldnames=jobs[0].keys())
-            writer.writeheader()
-            writer.writerows(jobs)
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows([job[k] for k in fieldnames] for job in jobs)
         print(f"✅ {len(jobs)} jobs written to {args.jobs_out}")
 
 if __name__ == "__main__":
@@ -2,61 +2,105 @@
 
 import pandas as pd
 import os
+import csv
 from datetime import datetime, timedelta
+import xlsxwriter
+from functools import lru_cache
 from printerconfig import get_printers
 
-def export_schedule(df, label, output_dir="schedules", shift_start_hour=8, schedule_start_date=None):
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Maps for printer name and rack
+@lru_cache(maxsize=1)
+def _printer_maps():
+    # Printer config is static for a run; build the rack/name maps once, not per export
     printers = get_printers()
     printer_rack_map = {pid: p['rack'] for pid, p in printers.items()}
     printer_name_map = {pid: p.get("name", f"Printer {pid}") for pid, p in printers.items()}
+    return printer_rack_map, printer_name_map
+
+# Columns always present in an export (filled with blanks when the input lacks them)
+DEFAULTED_COLS = ["batch_number", "technology", "material", "machine_model", "alpha_quantity_on_plate"]
 
+EXPORT_COLS = [
+    "job_id", "job_title", "batch_number", "technology", "material",
+    "printer", "printer_name", "rack",
+    "start", "end", "start_datetime", "end_datetime",
+    "objective",
+    "machine_model",
+    "alpha_quantity_on_plate"
+]
+
+def _base_date(schedule_start_date, caller):
     # Base date calculations using the PASSED schedule_start_date
     if schedule_start_date is None:
-        base_date = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
-        print("WARNING: schedule_start_date not provided to export_schedule. Defaulting to today's date.")
-    else:
-        base_date = schedule_start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        print(f"WARNING: schedule_start_date not provided to {caller}. Defaulting to today's date.")
+        return datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    return schedule_start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _export_path(output_dir, label, base_date):
+    os.makedirs(output_dir, exist_ok=True)
 
+    # --- NEW FILENAME LOGIC (Corrected to desired format) ---
+    # Extract month and day from schedule_start_date (base_date) for the "for_MM-DD" part
+    schedule_md = base_date.strftime("%m-%d")
+    # Extract current date AND TIME (hour, minute, second) for creation timestamp to ensure uniqueness
+    creation_timestamp_full = datetime.now().strftime("%m-%d-%y_%H-%M-%S")
+
+    # Construct the new filename
+    filename = f"{label.replace(' ', '_').lower()}_for_{schedule_md}_created_{creation_timestamp_full}.csv"
+    # --- END NEW FILENAME LOGIC ---
 
+    # === Save to local schedules folder ===
+    return os.path.join(output_dir, filename)
+
+def export_schedule(df, label, output_dir="schedules", shift_start_hour=8, schedule_start_date=None):
+    # Maps for printer name and rack
+    printer_rack_map, printer_name_map = _printer_maps()
+
+    base_date = _base_date(schedule_start_date, "export_schedule")
     shift_start_time = base_date + timedelta(hours=shift_start_hour)
 
     # Add derived columns
     if 'printer' in df.columns:
-        df["printer_name"] = df["printer"].map(printer_name_map)
+        df["printer_name"] = df["printer"].map(printer_name_map).fillna("Printer " + df["printer"].astype(str))
         df["rack"] = df["printer"].map(printer_rack_map)
 
     if 'start' in df.columns:
-        df["start_datetime"] = df["start"].apply(lambda m: base_date + timedelta(minutes=m))
-        df["end_datetime"] = df["end"].apply(lambda m: base_date + timedelta(minutes=m))
+        df["start_datetime"] = base_date + pd.to_timedelta(df["start"], unit="m")
+        df["end_datetime"] = base_date + pd.to_timedelta(df["end"], unit="m")
 
-    for col in ["batch_number", "technology", "material", "machine_model", "alpha_quantity_on_plate"]:
+    for col in DEFAULTED_COLS:
         if col not in df.columns:
             df[col] = None
-            
-    export_cols = [
-        "job_id", "job_title", "batch_number", "technology", "material",
-        "printer", "printer_name", "rack",
-        "start", "end", "start_datetime", "end_datetime",
-        "objective",
-        "machine_model",
-        "alpha_quantity_on_plate"
-    ]
-    actual_export_cols = [col for col in export_cols if col in df.columns]
-    export_df = df[actual_export_cols]
 
-    # --- NEW FILENAME LOGIC (Corrected to desired format) ---
-    # Extract month and day from schedule_start_date (base_date) for the "for_MM-DD" part
-    schedule_md = base_date.strftime("%m-%d")
-    # Extract current date AND TIME (hour, minute, second) for creation timestamp to ensure uniqueness
-    creation_timestamp_full = datetime.now().strftime("%m-%d-%y_%H-%M-%S")
+    actual_export_cols = [col for col in EXPORT_COLS if col in df.columns]
+    category_cols = [col for col in ("printer_name", "rack", "technology", "material") if col in actual_export_cols]
+    export_df = df[actual_export_cols].astype({col: "category" for col in category_cols})
 
-    # Construct the new filename
-    filename = f"{label.replace(' ', '_').lower()}_for_{schedule_md}_created_{creation_timestamp_full}.csv"
-    # --- END NEW FILENAME LOGIC ---
+    export_df.to_csv(_export_path(output_dir, label, base_date), index=False)
 
-    # === Save to local schedules folder ===
-    local_path = os.path.join(output_dir, filename)
-    export_df.to_csv(local_path, index=False)
+def write_dict_rows(rows, path, fieldnames):
+    # Writes row dicts with csv.DictWriter the way DataFrame.to_csv would: missing
+    # keys and NaN/None values become empty fields, lines end with os.linesep.
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, restval='', extrasaction='ignore', lineterminator=os.linesep)
+        writer.writeheader()
+        writer.writerows({key: '' if pd.isna(value) else value for key, value in row.items()} for row in rows)
+
+def export_jobs(jobs, label, output_dir="schedules", schedule_start_date=None):
+    # Unscheduled job dicts (no printer/start assigned yet) go straight to CSV with
+    # DictWriter: same columns and filename as export_schedule, no DataFrame built.
+    base_date = _base_date(schedule_start_date, "export_jobs")
+    present = set(jobs[0]) if jobs else set()
+    fieldnames = [col for col in EXPORT_COLS if col in present or col in DEFAULTED_COLS]
+    write_dict_rows(jobs, _export_path(output_dir, label, base_date), fieldnames)
+
+def write_xlsx(df: pd.DataFrame, out_path: str):
+    # xlsxwriter in constant_memory mode streams each row straight to the sheet XML
+    # instead of holding every cell in memory. That mode only accepts rows in order,
+    # which pandas' column-wise ExcelFormatter does not do, so rows are written here.
+    workbook = xlsxwriter.Workbook(out_path, {'constant_memory': True, 'strings_to_numbers': False})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, list(df.columns))
+    values = df.astype(object).where(df.notna(), None)
+    for row_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        worksheet.write_row(row_idx, 0, row)
+    workbook.close()
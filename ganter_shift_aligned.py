@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.offsetbox import AnchoredText
@@ -19,9 +20,6 @@ def plot_gantt(df, title, output_csv='schedules/operator_aware_composite.csv'):
     DAY_START_TIME = datetime.strptime(f"{SHIFT_START_MINUTES // 60:02d}:00", "%H:%M")
     WORKDAY_MINUTES = 12 * 60  # assume 12-hour shifts for layout
 
-    def get_day_block(minute):
-        return (minute - SHIFT_START_MINUTES) // WORKDAY_MINUTES, (minute - SHIFT_START_MINUTES) % WORKDAY_MINUTES
-
     def time_formatter(x, _):
         day = int(x) // WORKDAY_MINUTES + 1
         minutes_into_day = int(x) % WORKDAY_MINUTES
@@ -35,58 +33,60 @@ def plot_gantt(df, title, output_csv='schedules/operator_aware_composite.csv'):
     fig, ax = plt.subplots(figsize=(16, 10))
     schedule_export = []
 
-    for _, row in df.iterrows():
-        job_id = row["job_id"]
-        printer = row["printer"]
-        start = row.get("absolute_start_time", row["start_time"])  # ✅ Prefer absolute_start_time
-        end = row["end_time"]
-        duration = end - start
-        job_title = row["job_title"]
-        printer_name = PRINTER_NAMES.get(printer, f"Printer {printer}")
-
-        if start < SHIFT_START_MINUTES:
-            continue  # Skip jobs before shift start
-
-        day_start_idx, minute_start_in_day = get_day_block(start)
-        day_end_idx, _ = get_day_block(end)
-
-        if day_start_idx == day_end_idx:
-            y = printer_indices[printer] + day_start_idx * (len(printers) + 1)
-            ax.barh(y, duration, left=minute_start_in_day, height=0.6, color=color_map[printer])
-            ax.text(minute_start_in_day + 2, y, job_title, va='center', fontsize=8)
-            schedule_export.append({
-                'job_id': job_id,
-                'printer': printer,
-                'printer_name': printer_name,
-                'job_title': job_title,
-                'start_time': (DAY_START_TIME + timedelta(minutes=start % WORKDAY_MINUTES)).strftime('%H:%M'),
-                'end_time': (DAY_START_TIME + timedelta(minutes=end % WORKDAY_MINUTES)).strftime('%H:%M'),
-                'day': f"Day {day_start_idx + 1}"
-            })
+    # Resolve per-printer lookups once as columns instead of dict lookups per row
+    df = df.assign(
+        printer_name=df["printer"].map(PRINTER_NAMES).fillna("Printer " + df["printer"].astype(str)),
+        printer_idx=df["printer"].map(printer_indices),
+        color=df["printer"].map(color_map),
+    )
+
+    # === Segment table: one entry per (job, day) piece, computed with NumPy ===
+    start_col = "absolute_start_time" if "absolute_start_time" in df.columns else "start_time"  # ✅ Prefer absolute_start_time
+    starts = df[start_col].to_numpy()
+    ends = df["end_time"].to_numpy()
+    start_day = (starts - SHIFT_START_MINUTES) // WORKDAY_MINUTES
+    end_day = (ends - SHIFT_START_MINUTES) // WORKDAY_MINUTES
+    multi_day = start_day != end_day  # Jobs split over days are labelled "(cont.)"
+    # Multi-day jobs get one piece per day up to the one holding their last minute
+    last_day = np.where(multi_day, (ends - SHIFT_START_MINUTES - 1) // WORKDAY_MINUTES, start_day)
+    span = np.where(starts >= SHIFT_START_MINUTES, np.maximum(last_day - start_day + 1, 0), 0)  # Skip jobs before shift start
+
+    seg_job = np.repeat(np.arange(len(df)), span)
+    seg_day = start_day[seg_job] + np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+    day_open = SHIFT_START_MINUTES + seg_day * WORKDAY_MINUTES
+    seg_start = np.maximum(starts[seg_job], day_open)
+    seg_end = np.where(multi_day[seg_job], np.minimum(ends[seg_job], day_open + WORKDAY_MINUTES), ends[seg_job])
+    seg_minute_in_day = seg_start - day_open
+    seg_y = df["printer_idx"].to_numpy()[seg_job] + seg_day * (len(printers) + 1)
+
+    job_ids = df["job_id"].tolist()
+    printer_ids = df["printer"].tolist()
+    printer_names = df["printer_name"].tolist()
+    colors = df["color"].tolist()
+    titles = df["job_title"].tolist()
+    multi_day = multi_day.tolist()
+
+    # One broken_barh collection per Gantt row (printer × day) instead of a bar per piece
+    bars = pd.DataFrame({'y': seg_y, 'left': seg_minute_in_day, 'width': seg_end - seg_start, 'job': seg_job})
+    for y, row_bars in bars.groupby('y', sort=False):
+        ax.broken_barh(list(zip(row_bars['left'].tolist(), row_bars['width'].tolist())), (y - 0.3, 0.6),
+                       facecolors=colors[row_bars['job'].iat[0]])
+
+    for j, y, day, minute_in_day, piece_start, piece_end in zip(
+            seg_job.tolist(), seg_y.tolist(), seg_day.tolist(), seg_minute_in_day.tolist(), seg_start.tolist(), seg_end.tolist()):
+        if multi_day[j]:
+            ax.text(minute_in_day + 2, y, f"{titles[j]} (cont.)", va='center', fontsize=7)
         else:
-            remaining = duration
-            current_start = start
-            while remaining > 0:
-                current_day, minute_in_day = get_day_block(current_start)
-                y = printer_indices[printer] + current_day * (len(printers) + 1)
-                max_in_day = WORKDAY_MINUTES - minute_in_day
-                this_duration = min(remaining, max_in_day)
-
-                ax.barh(y, this_duration, left=minute_in_day, height=0.6, color=color_map[printer])
-                ax.text(minute_in_day + 2, y, f"{job_title} (cont.)", va='center', fontsize=7)
-
-                schedule_export.append({
-                    'job_id': job_id,
-                    'printer': printer,
-                    'printer_name': printer_name,
-                    'job_title': job_title,
-                    'start_time': (DAY_START_TIME + timedelta(minutes=current_start % WORKDAY_MINUTES)).strftime('%H:%M'),
-                    'end_time': (DAY_START_TIME + timedelta(minutes=(current_start + this_duration) % WORKDAY_MINUTES)).strftime('%H:%M'),
-                    'day': f"Day {current_day + 1}"
-                })
-
-                remaining -= this_duration
-                current_start += this_duration
+            ax.text(minute_in_day + 2, y, titles[j], va='center', fontsize=8)
+        schedule_export.append({
+            'job_id': job_ids[j],
+            'printer': printer_ids[j],
+            'printer_name': printer_names[j],
+            'job_title': titles[j],
+            'start_time': (DAY_START_TIME + timedelta(minutes=piece_start % WORKDAY_MINUTES)).strftime('%H:%M'),
+            'end_time': (DAY_START_TIME + timedelta(minutes=piece_end % WORKDAY_MINUTES)).strftime('%H:%M'),
+            'day': f"Day {day + 1}"
+        })
 
     total_days = max(df["end_time"]) // WORKDAY_MINUTES + 1
     y_ticks, y_labels = [], []
@@ -0,0 +1,9 @@
+# In MES-Demo July.24/jitcompat.py
+
+# numba is optional: `from jitcompat import njit` gives numba's njit when it is
+# installed, and otherwise a no-op decorator so helpers run as plain Python.
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda func: func
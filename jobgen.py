@@ -1,18 +1,25 @@
 # In MES-Demo July.24/jobgen.py
 
 import warnings
+import numpy as np
 import pandas as pd
-import math
 
 def generate_jobs_from_excel(filepath="Sliced Build Generated.xlsx"):
     # 1. Load
     if filepath.lower().endswith(".xlsx"):
         df = pd.read_excel(filepath)
+    elif filepath.lower().endswith(".parquet"):
+        df = pd.read_parquet(filepath)
     else:
         df = pd.read_csv(filepath)
+    return generate_jobs(df)
+
+def generate_jobs(df):
+    # Accepts the sliced-build sheet as an in-memory DataFrame so callers that just
+    # built it can skip the write/read round-trip through disk.
 
     # 2. Normalize headers: strip whitespace, replace spaces with underscores
-    df.columns = [c.strip().replace(' ', '_') for c in df.columns]
+    df = df.rename(columns=lambda c: c.strip().replace(' ', '_'))
     print("🧐 Columns loaded for job gen:", df.columns.tolist())
 
     # 3. Default Status and filter
@@ -28,44 +35,38 @@ def generate_jobs_from_excel(filepath="Sliced Build Generated.xlsx"):
     )
         df['Quantity_of_Runs'] = 1
 
-    # 5. Explode into job dicts
-    jobs = []
-    job_id = 0
-    for _, row in df.iterrows():
-        # use the underscore name here:
-        qty = int(row['Quantity_of_Runs']) if not pd.isna(row['Quantity_of_Runs']) else 1
-
-        # same for duration:
-        if 'Estimated_Print_Time_Minutes' in df.columns and not pd.isna(row['Estimated_Print_Time_Minutes']):
-            dur = int(row['Estimated_Print_Time_Minutes'])
-        else:
-            dur = 30
-
-        # material & tech—use underscore names
-        raw_mat = row.get('Required_Material_ID','')
-        material = raw_mat.strip() if isinstance(raw_mat, str) else ''
-        raw_tech = row.get('Technology','')
-        tech     = raw_tech.strip()   if isinstance(raw_tech, str) else ''
+    # 5. Clean the per-row fields once, column-wise
+    def text_col(name):
+        if name not in df.columns:
+            return np.full(len(df), '', dtype=object)
+        return df[name].astype(object).fillna('').astype(str).str.strip().to_numpy(dtype=object)
 
-        sliced_id = row.get('Sliced_Build_ID','').strip()
-        
-        machine_model = row.get('Machine_Model', '').strip() 
+    qty = df['Quantity_of_Runs'].fillna(1).astype(int).to_numpy()
+    if 'Estimated_Print_Time_Minutes' in df.columns:
+        dur = df['Estimated_Print_Time_Minutes'].fillna(30).astype(int).to_numpy()
+    else:
+        dur = np.full(len(df), 30)
+    material = text_col('Required_Material_ID')
+    tech = text_col('Technology')
+    if 'Alpha_Quantity_on_Plate' in df.columns:
+        alpha_qty_on_plate = df['Alpha_Quantity_on_Plate'].to_numpy()
+    else:
+        alpha_qty_on_plate = np.ones(len(df), dtype=int)
 
-        # Capture Alpha_Quantity_on_Plate from the input DataFrame
-        alpha_qty_on_plate = row.get('Alpha_Quantity_on_Plate', 1) 
+    # 6. Explode into one job per run: repeat each row qty times and number the runs
+    pos = np.repeat(np.arange(len(df)), qty)
+    run = np.arange(len(pos)) - np.repeat(np.cumsum(qty) - qty, qty) + 1
 
-        for i in range(qty):
-            jobs.append({
-                'job_id': job_id,
-                'job_title': f"{sliced_id}_R{i+1}",
-                'required_material': material,
-                'required_technology': tech,
-                'duration': dur,
-                'material': material, 
-                'technology': tech,   
-                'machine_model': machine_model,
-                'alpha_quantity_on_plate': alpha_qty_on_plate 
-            })
-            job_id += 1
+    exp = pd.DataFrame({
+        'job_id': np.arange(len(pos)),
+        'job_title': text_col('Sliced_Build_ID')[pos] + '_R' + run.astype(str).astype(object),
+        'required_material': material[pos],
+        'required_technology': tech[pos],
+        'duration': dur[pos],
+        'material': material[pos],
+        'technology': tech[pos],
+        'machine_model': text_col('Machine_Model')[pos],
+        'alpha_quantity_on_plate': alpha_qty_on_plate[pos]
+    })
 
-    return jobs
\ No newline at end of file
+    return exp.to_dict('records')
\ No newline at end of file
@@ -1,155 +1,186 @@
 #!/usr/bin/env python3
 import os
+import sys
 import argparse
+import numpy as np
 import pandas as pd
-import math
+from pandas.api.types import union_categoricals
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
 # Domain imports
 from printerconfig import get_printers
-from jobgen import generate_jobs_from_excel
+from jobgen import generate_jobs
 from scheduler import build_model
 from solver import solve_and_extract
-from exporter import export_schedule
+from exporter import export_schedule, export_jobs, write_dict_rows, write_xlsx
+from jitcompat import njit
 
 # --- CONFIG: Input/Output File Paths --------------------------------
 # NOTE: These paths are relative to the project root.
-INPUT_DIR = "Data Input"
-OUTPUT_DIR = "schedules"
+INPUT_DIR = Path("Data Input")
+OUTPUT_DIR = Path("schedules")
 
-MPP_FILE        = os.path.join(INPUT_DIR, "MPP Data 2 Private Offices.csv")
-BOM_FILE        = os.path.join(INPUT_DIR, "20250721_PO_Rebuild Components BOM.csv")
-SLICED_FILE     = os.path.join(INPUT_DIR, "Sliced Build Generated.xlsx")
-JOBS_OUTPUT_CSV = os.path.join(OUTPUT_DIR, "generated_jobs.csv")
+MPP_FILE        = INPUT_DIR / "MPP Data 2 Private Offices.csv"
+BOM_FILE        = INPUT_DIR / "20250721_PO_Rebuild Components BOM.csv"
+SLICED_FILE     = INPUT_DIR / "Sliced Build Generated.xlsx"
+JOBS_OUTPUT_CSV = OUTPUT_DIR / "generated_jobs.csv"
 # --------------------------------------------------------------------
 
+# BOM columns used by the per-part aggregation (Required_Material_ID and
+# Machine_Model are optional and defaulted when absent)
+BOM_MERGE_COLUMNS = ['Product_SKU', 'Part_Name', 'Print_Quantity', 'Alpha_Quantity_on_Plate', 'Duration',
+                     'Printing_Method', 'Required_Material_ID', 'Machine_Model']
+
 
 # --- ETL: build sliced-build sheet from BOM + MPP -----------------
-def build_sliced_build_ID(mpp_path: str, bom_path: str, out_path: str):
-    df_mpp = pd.read_csv(mpp_path, parse_dates=['Overall_Due_Date'])
-    df_bom = pd.read_csv(bom_path)
+def build_sliced_build_ID(mpp_path: Path, bom_path: Path, out_path: Path) -> pd.DataFrame:
+    # pyarrow's multithreaded CSV reader; Duration is pinned to str because pyarrow
+    # would otherwise infer "HH:MM:SS" as a time of day, which to_timedelta rejects
+    df_mpp = pd.read_csv(mpp_path, parse_dates=['Overall_Due_Date'], engine='pyarrow')
+    df_bom = pd.read_csv(bom_path, dtype={'Duration': str}, engine='pyarrow')
 
     # Normalize BOM Product_SKU formatting: convert dashes to underscores to match MPP
     df_bom['Product_SKU'] = df_bom['Product_SKU'].str.replace('-', '_')
+    # Join on a categorical SKU with identical categories on both sides, so the
+    # merge compares integer codes instead of hashing strings
+    sku_dtype = pd.CategoricalDtype(union_categoricals(
+        [pd.Categorical(df_bom['Product_SKU']), pd.Categorical(df_mpp['Product_SKU'])]
+    ).categories)
+    df_bom['Product_SKU'] = df_bom['Product_SKU'].astype(sku_dtype)
+    df_mpp['Product_SKU'] = df_mpp['Product_SKU'].astype(sku_dtype)
 
-    # Merge BOM with MPP to get per-MPP-item quantities and associated MPP details
-    df_merged = df_bom.merge(
-        df_mpp[['MPP_Item_ID','Product_SKU','Overall_Due_Date','Status','Project_Phase']],
+    # Merge BOM with MPP to get per-MPP-item quantities and associated MPP details.
+    # Only the columns the aggregation reads are carried into the join.
+    bom_cols = [c for c in BOM_MERGE_COLUMNS if c in df_bom.columns]
+    df_merged = df_bom[bom_cols].merge(
+        df_mpp[['Product_SKU','Overall_Due_Date','Project_Phase']],
         on='Product_SKU',
         how='inner'
     )
 
     # --- AGGREGATED DEMAND LOGIC: Consolidate total demand per Part_Name across all MPP items ---
-    aggregated_parts_data = {} 
-
-    for _, r in df_merged.iterrows():
-        part_name = r['Part_Name']
-        quantity_per_product_unit = r['Print_Quantity']
-        
-        # Determine current material ID from the row, stripping whitespace
-        current_material_id = r.get('Required_Material_ID', '').strip() 
-        
-        if part_name not in aggregated_parts_data:
-            # Initialize data for a new part_name, including initial values for new fields
-            aggregated_parts_data[part_name] = {
-                'total_quantity_needed': 0,
-                'Alpha_Quantity_on_Plate': r['Alpha_Quantity_on_Plate'],
-                'Duration': r['Duration'], # Assuming duration is consistent per part
-                'Printing_Method': r['Printing_Method'],
-                'Required_Material_ID': current_material_id, 
-                'Machine_Model': r.get('Machine_Model', ''),
-                'earliest_due_date': r['Overall_Due_Date'],
-                'project_phases': set()
-            }
-        
-        aggregated_parts_data[part_name]['total_quantity_needed'] += quantity_per_product_unit
-        
-        aggregated_parts_data[part_name]['earliest_due_date'] = min(
-            aggregated_parts_data[part_name]['earliest_due_date'],
-            r['Overall_Due_Date']
-        )
-        
-        aggregated_parts_data[part_name]['project_phases'].add(r['Project_Phase'])
-
-
-    rows = []
-    for part_name, data in aggregated_parts_data.items():
-        total_quantity_needed = data['total_quantity_needed']
-        alpha_quantity_on_plate = data['Alpha_Quantity_on_Plate']
-        
-        number_of_runs_for_part = math.ceil(total_quantity_needed / alpha_quantity_on_plate)
-
-        # Handle potential missing or invalid Duration values
-        raw_duration = data['Duration']
-        try:
-            timedelta_duration = pd.to_timedelta(raw_duration)
-            if pd.isna(timedelta_duration): 
-                estimated_print_time_minutes = 30 
-                print(f"WARNING: Duration for part '{part_name}' is invalid or missing (after conversion). Using default of {estimated_print_time_minutes} minutes.")
-            else:
-                estimated_print_time_minutes = int(timedelta_duration.total_seconds() / 60)
-        except Exception as e:
-            estimated_print_time_minutes = 30
-            print(f"WARNING: Duration for part '{part_name}' caused error: '{e}'. Using default of {estimated_print_time_minutes} minutes.")
-
-        # Apply material inference logic more robustly
-        final_material_id = data['Required_Material_ID']
-        if not final_material_id.strip():
-            if data['Printing_Method'] == 'LFAM':
-                final_material_id = 'PETG'
-            elif data['Printing_Method'] == 'FDM':
-                final_material_id = 'PETG'
-        
-        formatted_due_date = data['earliest_due_date'].strftime('%Y-%m-%d') if pd.notna(data['earliest_due_date']) else ''
-        formatted_project_phases = ", ".join(sorted(list(data['project_phases'])))
-
-        for run_idx in range(1, number_of_runs_for_part + 1):
-            rows.append({
-                'Sliced Build ID': f"MPP_ALL__{part_name}_R{run_idx}", 
-                'Quantity of Runs': 1,
-                'Alpha Quantity on Plate': alpha_quantity_on_plate,
-                'Total Required Quantity': total_quantity_needed, 
-                'Estimated Print Time Minutes': estimated_print_time_minutes,
-                'Required Material ID': final_material_id,
-                'Technology': data['Printing_Method'],
-                'Status': 'Queued', 
-                'Created Timestamp': datetime.now().isoformat(),
-                'Overall_Due_Date': formatted_due_date,
-                'Project_Phase': formatted_project_phases,
-                'Machine_Model': data['Machine_Model']
-            })
-
-    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
-    pd.DataFrame(rows).to_excel(out_path, index=False)
-    print(f"✅ Sliced build sheet written to {out_path} ({len(rows)} rows)")
+    for col in ('Required_Material_ID', 'Machine_Model'):
+        if col not in df_merged.columns:
+            df_merged[col] = ''
+    # Determine material ID per row, stripping whitespace
+    df_merged['Required_Material_ID'] = df_merged['Required_Material_ID'].fillna('').astype(str).str.strip()
+    # Low-cardinality group key and per-part strings as categoricals
+    for col in ('Part_Name', 'Printing_Method', 'Project_Phase', 'Machine_Model'):
+        df_merged[col] = df_merged[col].astype('category')
 
+    # One pass in pandas: sum demand, earliest due date, all phases. The per-part
+    # constants (duration etc. assumed consistent per part) come from each part's
+    # literal first row, blanks included; groupby 'first' would skip NaN and
+    # silently take a later row's value instead
+    grouped = df_merged.groupby('Part_Name', sort=False, observed=True)
+    agg = grouped.agg(
+        total_quantity_needed=('Print_Quantity', 'sum'),
+        earliest_due_date=('Overall_Due_Date', 'min'),
+    ).join(
+        df_merged.drop_duplicates('Part_Name').set_index('Part_Name')[
+            ['Alpha_Quantity_on_Plate', 'Duration', 'Printing_Method', 'Required_Material_ID', 'Machine_Model']
+        ]
+    )
+    # Distinct phases per part come from the C-level groupby unique; only the small
+    # per-part arrays are sorted and joined in Python
+    agg['project_phases'] = grouped['Project_Phase'].unique().map(lambda phases: ", ".join(sorted(phases)))
 
-def main():
-    # --- Pre-flight Checks ---
-    for f in [MPP_FILE, BOM_FILE]:
-        if not os.path.exists(f):
-            print(f"❌ Error: Required input file not found at '{f}'. Halting execution.")
-            return
+    # Parse every Duration in one pass; invalid or missing values fall back to a default
+    default_print_minutes = 30
+    durations = pd.to_timedelta(agg['Duration'], errors='coerce')
+    invalid_parts = agg.index[durations.isna()]
+    if len(invalid_parts):
+        print(f"WARNING: Duration for part(s) {', '.join(map(str, invalid_parts))} is invalid or missing. Using default of {default_print_minutes} minutes.")
+    agg['estimated_print_time_minutes'] = (durations.dt.total_seconds() // 60).fillna(default_print_minutes).astype('int64')
 
-    # Step 1: Build sliced-build sheet
-    print(f"Building sliced build sheet from {MPP_FILE} and {BOM_FILE}...")
-    build_sliced_build_ID(MPP_FILE, BOM_FILE, SLICED_FILE)
-    
-    # --- Post-build Check ---
-    if not os.path.exists(SLICED_FILE):
-        print(f"❌ Error: Sliced build file was not created at '{SLICED_FILE}'. Halting execution.")
-        return
+    # Apply material inference logic more robustly: blank materials get the
+    # technology's default
+    default_material = {'LFAM': 'PETG', 'FDM': 'PETG'}
+    agg['Required_Material_ID'] = agg['Required_Material_ID'].mask(
+        agg['Required_Material_ID'] == '',
+        agg['Printing_Method'].map(default_material).fillna('')
+    )
+    agg['formatted_due_date'] = agg['earliest_due_date'].dt.strftime('%Y-%m-%d').fillna('')
 
-    # --- Post-build Check ---
-    if not os.path.exists(SLICED_FILE):
-        print(f"❌ Error: Sliced build file was not created at '{SLICED_FILE}'. Halting execution.")
-        return
+    # One timestamp for the whole batch build, shared by every output row
+    created_ts = datetime.now().isoformat()
 
-    # Step 2: Generate jobs from sliced sheet
-    print(f"Generating jobs from {SLICED_FILE}...")
-    printers = get_printers()
-    jobs = generate_jobs_from_excel(SLICED_FILE) 
+    # Expand each part into one row per run, column-wise: repeat the part rows
+    # and number runs 1..n from each part's offset in the expanded frame.
+    # Integer quantities use an exact integer ceil; anything else falls back to np.ceil.
+    total_qty = agg['total_quantity_needed'].to_numpy()
+    alpha_qty = agg['Alpha_Quantity_on_Plate'].to_numpy()
+    if np.issubdtype(total_qty.dtype, np.integer) and np.issubdtype(alpha_qty.dtype, np.integer):
+        runs = (-(-total_qty // alpha_qty)).astype(np.int64)
+    else:
+        runs = np.ceil(total_qty / alpha_qty).astype(np.int64)
+    exp = agg.iloc[np.repeat(np.arange(len(agg)), runs)].reset_index()
+    run_idx = pd.Series(np.arange(runs.sum()) - np.repeat(np.cumsum(runs) - runs, runs) + 1)
+
+    df_sliced = pd.DataFrame({
+        'Sliced Build ID': 'MPP_ALL__' + exp['Part_Name'].astype(str) + '_R' + run_idx.astype(str),
+        'Quantity of Runs': 1,
+        'Alpha Quantity on Plate': exp['Alpha_Quantity_on_Plate'],
+        'Total Required Quantity': exp['total_quantity_needed'],
+        'Estimated Print Time Minutes': exp['estimated_print_time_minutes'],
+        'Required Material ID': exp['Required_Material_ID'],
+        'Technology': exp['Printing_Method'],
+        'Status': 'Queued',
+        'Created Timestamp': created_ts,
+        'Overall_Due_Date': exp['formatted_due_date'],
+        'Project_Phase': exp['project_phases'],
+        'Machine_Model': exp['Machine_Model']
+    })
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    write_xlsx(df_sliced, out_path)
+    print(f"✅ Sliced build sheet written to {out_path} ({len(df_sliced)} rows)")
+    return df_sliced
+
+
+# --- Batching ------------------------------------------------------
+@njit(cache=True)
+def assign_batches(durations, cap):
+    # Greedy batching in job order: each batch takes the longest run of jobs whose
+    # total duration fits in cap (always at least one job). With running totals in
+    # a cumsum, every batch boundary is a single searchsorted instead of a per-job step.
+    n = len(durations)
+    batch_ids = np.empty(n, dtype=np.int64)
+    cum = np.cumsum(durations)
+    start, batch = 0, 0
+    while start < n:
+        base = cum[start - 1] if start > 0 else 0
+        end = max(np.searchsorted(cum, base + cap, side='right'), start + 1)
+        batch_ids[start:end] = batch
+        start, batch = end, batch + 1
+    return batch_ids
+
+
+# --- Solving -------------------------------------------------------
+def _solve_batch(printers, batch_jobs, params, solver_params, debug=False):
+    # Top-level so it can be pickled into a worker process; the CP-SAT model is
+    # built inside the worker and only the result frame travels back.
+    model, starts, ends, presence, penalties = build_model(
+        printers, batch_jobs, 'operator_aware_composite', params, debug=debug
+    )
+    return solve_and_extract(model, starts, ends, presence, batch_jobs, printers, penalties,
+                             solver_params=solver_params)
+
+
+def _resolve_input(path, label):
+    # Scripted runs fail fast on a missing file; an interactive terminal gets one
+    # chance to point at the right file instead.
+    if not path.is_file() and sys.stdin.isatty():
+        path = Path(input(f"{label} not found at '{path}'. Enter path (blank to abort): ").strip() or path)
+    return path
+
+
+def main():
     parser = argparse.ArgumentParser(description="Run the MES scheduling system.")
+    parser.add_argument('--mpp', type=Path, default=MPP_FILE, help=f'Path to the MPP data CSV file. Default: {MPP_FILE}')
+    parser.add_argument('--bom', type=Path, default=BOM_FILE, help=f'Path to the BOM data CSV file. Default: {BOM_FILE}')
+    parser.add_argument('--sliced-out', type=Path, default=SLICED_FILE, help=f'Path for the output sliced build sheet. Default: {SLICED_FILE}')
     parser.add_argument(
         '--start-date',
         type=str,
@@ -162,25 +193,52 @@ def main():
     parser.add_argument('--penalty', type=int, default=5, help='Penalty value for close finishes on different racks.')
     parser.add_argument('--buffer', type=int, default=0, help='Fixed gap in minutes between jobs.')
     parser.add_argument('--debug', action='store_true', help='Enable debug output.')
-    
+    parser.add_argument('--workers', type=int, default=0, help='Batches solved in parallel (0 = half the CPU cores).')
+    parser.add_argument('--solver-threads', type=int, default=0, help='CP-SAT search workers per batch (0 = split the CPU cores across parallel batches).')
+    parser.add_argument('--time-limit', type=float, default=100.0, help='CP-SAT time limit per batch, in seconds.')
+    parser.add_argument('--linearization-level', type=int, choices=(0, 1, 2), default=None, help="CP-SAT LP linearization level; 2 may help hard composite-objective batches. Default: CP-SAT's own.")
+
+    # Parse everything up front so a bad flag fails before any compute
     args = parser.parse_args()
+    schedule_start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
     shift_start_hour = args.shift_start_hour
     shift_length_hours = args.shift_length
     stagger_minutes = args.stagger
     penalty_value = args.penalty
     job_buffer_minutes = args.buffer
     debug = args.debug
-    
+
     shift_start = shift_start_hour * 60
     shift_length = shift_length_hours * 60
     # === End parameter setup ===
 
+    # --- Pre-flight Checks ---
+    mpp_path = _resolve_input(args.mpp, "MPP data")
+    bom_path = _resolve_input(args.bom, "BOM data")
+    for f in (mpp_path, bom_path):
+        if not f.is_file():
+            print(f"❌ Error: Required input file not found at '{f}'. Halting execution.")
+            return
+
+    # Step 1: Build sliced-build sheet
+    print(f"Building sliced build sheet from {mpp_path} and {bom_path}...")
+    df_sliced = build_sliced_build_ID(mpp_path, bom_path, args.sliced_out)
+
+    # --- Post-build Check ---
+    if not args.sliced_out.is_file():
+        print(f"❌ Error: Sliced build file was not created at '{args.sliced_out}'. Halting execution.")
+        return
+
+    # Step 2: Generate jobs from the sliced sheet (already in memory)
+    print(f"Generating jobs from {args.sliced_out}...")
+    printers = get_printers()
+    jobs = generate_jobs(df_sliced)
+
     # Persist generated jobs using export_schedule for consistency and OneDrive sync
     # Pass output_dir for the specific subfolder
-    export_schedule(pd.DataFrame(jobs), 'generated_jobs', 
-                    output_dir=os.path.dirname(JOBS_OUTPUT_CSV), 
-                    shift_start_hour=shift_start_hour, 
-                    schedule_start_date=schedule_start_date) 
+    export_jobs(jobs, 'generated_jobs',
+                output_dir=JOBS_OUTPUT_CSV.parent,
+                schedule_start_date=schedule_start_date)
     print(f"✅ {len(jobs)} jobs written to {JOBS_OUTPUT_CSV}") 
 
     # Define batching window
@@ -189,51 +247,55 @@ def main():
 
     # Greedy batching by job_title
     jobs_sorted = sorted(jobs, key=lambda j: j['job_title'])
-    batches = []
-    current_batch = []
-    current_total = 0
-
-    for job in jobs_sorted:
-        if current_total + job['duration'] <= target_minutes_per_batch:
-            current_batch.append(job)
-            current_total += job['duration']
-        else:
-            batches.append(current_batch)
-            current_batch = [job]
-            current_total = job['duration']
-    if current_batch:
-        batches.append(current_batch)
+    durations = np.fromiter((j['duration'] for j in jobs_sorted), dtype=np.int64, count=len(jobs_sorted))
+    batch_ids = assign_batches(durations, target_minutes_per_batch)
+    edges = np.r_[0, np.flatnonzero(np.diff(batch_ids)) + 1, len(jobs_sorted)]
+    batches = [jobs_sorted[lo:hi] for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
 
     print(f"📊 Total Batches: {len(batches)}")
 
-    # Solve each batch
+    # Solve batches in parallel worker processes. Batches share no state, and the
+    # time offsets are applied below in batch order once results come back.
+    params = {
+        'shift_start': shift_start,
+        'shift_hours': shift_length_hours,
+        'diff': stagger_minutes,
+        'penalty_val': penalty_value,
+        'job_buffer_minutes' : job_buffer_minutes
+    }
+    cpu_count = os.cpu_count() or 1
+    max_workers = args.workers or max(1, cpu_count // 2)
+    max_workers = max(1, min(max_workers, len(batches)))
+    # Split the cores between concurrent solves so CP-SAT threads don't oversubscribe
+    solver_params = {
+        'num_search_workers': args.solver_threads or max(1, cpu_count // max_workers),
+        'max_time_in_seconds': args.time_limit,
+        'log_search_progress': debug,
+        'linearization_level': args.linearization_level,
+    }
+    print(f"🧵 Solving with {max_workers} parallel batch worker(s), {solver_params['num_search_workers']} CP-SAT thread(s) each")
+
     results, unscheduled, offset = [], [], 0
-    for idx, batch_jobs in enumerate(batches, start=1):
-        print(f"\n🚀 Solving batch {idx}/{len(batches)} with {len(batch_jobs)} jobs")
-        params = {
-            'shift_start': shift_start,
-            'shift_hours': shift_length_hours,
-            'diff': stagger_minutes,
-            'penalty_val': penalty_value,
-            'job_buffer_minutes' : job_buffer_minutes
-        }
-        model, starts, ends, assigns, penalty_var = build_model(
-            printers, batch_jobs, 'operator_aware_composite', params, debug=debug
-        )
-        df_batch = solve_and_extract(model, starts, ends, assigns, batch_jobs, printers, penalty_var)
-        if df_batch.empty:
-            print(f"❌ Batch {idx} failed; adding to unscheduled pool.")
-            unscheduled.extend(batch_jobs)
-            continue
-        # Attach metadata
-        df_batch['batch_number'] = idx
-        df_batch['technology'] = [j['required_technology'] for j in batch_jobs]
-        df_batch['material']   = [j['required_material'] for j in batch_jobs]
-        # Offset times
-        df_batch['start'] += offset
-        df_batch['end']   += offset
-        results.append(df_batch)
-        offset += shift_length * 2
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = []
+        for idx, batch_jobs in enumerate(batches, start=1):
+            print(f"📤 Submitting batch {idx}/{len(batches)} with {len(batch_jobs)} jobs")
+            futures.append(pool.submit(_solve_batch, printers, batch_jobs, params, solver_params, debug))
+
+        for idx, (batch_jobs, future) in enumerate(zip(batches, futures), start=1):
+            df_batch = future.result()
+            print(f"\n🚀 Batch {idx}/{len(batches)} ({len(batch_jobs)} jobs) finished solving")
+            if df_batch.empty:
+                print(f"❌ Batch {idx} failed; adding to unscheduled pool.")
+                unscheduled.extend(batch_jobs)
+                continue
+            # Attach metadata (technology/material already come back from solve_and_extract)
+            df_batch['batch_number'] = idx
+            # Offset times
+            df_batch['start'] += offset
+            df_batch['end']   += offset
+            results.append(df_batch)
+            offset += shift_length * 2
 
     # Save schedule outputs
     if results:
@@ -245,8 +307,8 @@ def main():
                         schedule_start_date=schedule_start_date)
         print(f"\n✅ Combined schedule saved to schedules/combined_results.csv")
         if unscheduled:
-            unsched_path = os.path.join(os.path.dirname(JOBS_OUTPUT_CSV), 'unscheduled_jobs.csv') 
-            pd.DataFrame(unscheduled).to_csv(unsched_path, index=False)
+            unsched_path = JOBS_OUTPUT_CSV.parent / 'unscheduled_jobs.csv' 
+            write_dict_rows(unscheduled, unsched_path, list(unscheduled[0].keys()))
             print(f"⚠️  {len(unscheduled)} jobs unscheduled; saved to {unsched_path}")
     else:
         print("\n❌ No batches succeeded.")
@@ -1,107 +1,178 @@
 # In MES-Demo July.24/scheduler.py
 
+from collections import defaultdict
+import numpy as np
 from ortools.sat.python import cp_model
-
-def compatible_printers(printers, material, technology, machine_model): # Add machine_model parameter
-    # Ensure .strip() is used on all string comparisons for robustness
-    return [
-        pid for pid, spec in printers.items()
-        if spec['material'].strip() == material.strip() and \
-           spec['technology'].strip() == technology.strip() and \
-           spec['model'].strip() == machine_model.strip() # Add machine_model check
-    ]
-
-def define_job_variables(model, jobs, printers, horizon, printer_rack_id, shift_start, job_buffer_minutes=0):
+from ortools.sat.python.cp_model import LinearExpr
+from jitcompat import njit
+
+@njit(cache=True)
+def aggregate_by_type(type_codes, amounts, n_types):
+    # Per-type totals of amounts, keyed by small integer type codes
+    totals = np.zeros(n_types, dtype=np.int64)
+    for i in range(len(type_codes)):
+        totals[type_codes[i]] += amounts[i]
+    return totals
+
+def define_job_variables(model, jobs, printers, horizon, compat_index, compat_racks, shift_start, job_buffer_minutes=0,
+                         track_racks=True):
     start_vars = {}
     end_vars = {}
-    assigned_printer_vars = {}
     presence_literals = {}
     printer_intervals = {pid: [] for pid in printers}
-    rack_vars = {}
+    job_on_rack = {}
 
     for jid, job in enumerate(jobs):
         # Add the global buffer to the duration for scheduling purposes.
         duration = job['duration'] + job_buffer_minutes
         
-        # Pass machine_model from job data to compatible_printers
-        valid_pids = compatible_printers(
-            printers,
-            job['required_material'],
-            job['required_technology'],
-            job['machine_model'] # Pass machine_model here
-        )
+        # Compatible printers match on material, technology and machine model
+        key = (job['required_material'].strip(), job['required_technology'].strip(), job['machine_model'].strip())
+        valid_pids = compat_index.get(key, [])
         
         if not valid_pids:
             raise ValueError(f"No valid printers for job {jid}: {job}")
         start = model.NewIntVar(shift_start, horizon - duration, f"start_{jid}")
-        end = model.NewIntVar(0, horizon, f'end_{jid}')
-        printer = model.NewIntVarFromDomain(cp_model.Domain.FromValues(valid_pids), f'printer_{jid}')
+        end = model.NewIntVar(shift_start + duration, horizon, f'end_{jid}')
         model.Add(end == start + duration)
 
         start_vars[jid] = start
         end_vars[jid] = end
-        assigned_printer_vars[jid] = printer
         presence_literals[jid] = {}
 
-        for pid in valid_pids:
-            literal = model.NewBoolVar(f'is_j{jid}_on_p{pid}')
-            presence_literals[jid][pid] = literal
-            model.Add(printer == pid).OnlyEnforceIf(literal)
-            model.Add(printer != pid).OnlyEnforceIf(literal.Not())
-            interval = model.NewOptionalIntervalVar(start, duration, end, literal, f'int_j{jid}_p{pid}')
-            printer_intervals[pid].append(interval)
-
-        rack = model.NewIntVarFromDomain(
-            cp_model.Domain.FromValues(list(set(printer_rack_id.values()))),
-            f"rack_{jid}"
-        )
-        for pid, literal in presence_literals[jid].items():
-            model.Add(rack == printer_rack_id[pid]).OnlyEnforceIf(literal)
-        rack_vars[jid] = rack
-
-    return start_vars, end_vars, assigned_printer_vars, presence_literals, printer_intervals, rack_vars
+        if len(valid_pids) == 1:
+            # Only one compatible printer: the job is always on it, so it gets a
+            # mandatory interval and a constant-true presence literal
+            pid = valid_pids[0]
+            presence_literals[jid][pid] = model.NewConstant(1)
+            printer_intervals[pid].append(model.NewIntervalVar(start, duration, end, f'int_j{jid}_p{pid}'))
+        else:
+            # The job runs on exactly one of its compatible printers; the chosen
+            # printer is read back from these literals after solving
+            for pid in valid_pids:
+                literal = model.NewBoolVar(f'is_j{jid}_on_p{pid}')
+                presence_literals[jid][pid] = literal
+                interval = model.NewOptionalIntervalVar(start, duration, end, literal, f'int_j{jid}_p{pid}')
+                printer_intervals[pid].append(interval)
+            model.AddExactlyOne(presence_literals[jid].values())
+
+        # "Job is on rack r" literals: exactly one printer is chosen, so each rack's
+        # literal is the sum of its printers' presence literals (or that literal itself)
+        if track_racks:
+            job_on_rack[jid] = {}
+            for r, rack_pids in compat_racks[key].items():
+                literals = [presence_literals[jid][pid] for pid in rack_pids]
+                if len(literals) == 1:
+                    job_on_rack[jid][r] = literals[0]
+                else:
+                    on_rack = model.NewBoolVar(f"on_rack_j{jid}_r{r}")
+                    model.Add(on_rack == LinearExpr.Sum(literals))
+                    job_on_rack[jid][r] = on_rack
+
+    return start_vars, end_vars, presence_literals, printer_intervals, job_on_rack
 
 def add_no_overlap_constraints(model, printer_intervals):
     for pid, intervals in printer_intervals.items():
         if intervals:
             model.AddNoOverlap(intervals)
 
-def add_printer_usage_variables(model, presence_literals, jobs, printers):
+def add_printer_usage_variables(model, printer_job_counts):
+    # A printer is used iff its job count is nonzero: two linear reifications on
+    # the existing count instead of a BoolOr/BoolAnd over every presence literal
     printer_usage = {}
-    for pid in printers:
+    for pid, count in printer_job_counts.items():
         used = model.NewBoolVar(f'printer_{pid}_used')
-        literals = [presence_literals[jid][pid] for jid in range(len(jobs)) if pid in presence_literals[jid]]
-        if literals:
-            model.AddBoolOr(literals).OnlyEnforceIf(used)
-            model.AddBoolAnd([lit.Not() for lit in literals]).OnlyEnforceIf(used.Not())
-        else:
-            model.Add(used == 0)
+        model.Add(count >= 1).OnlyEnforceIf(used)
+        model.Add(count == 0).OnlyEnforceIf(used.Not())
         printer_usage[pid] = used
     return printer_usage
 
+@njit(cache=True)
+def greedy_lpt(order, durations, compat_offsets, compat_printers, n_printers, shift_start, horizon):
+    # Jobs in the given order each go on the compatible printer (CSR row of printer
+    # indices) that frees up earliest, first such printer on ties. Jobs that would
+    # overrun the horizon are left unplaced with start and printer -1.
+    next_free = np.full(n_printers, shift_start, dtype=np.int64)
+    starts = np.full(len(durations), -1, dtype=np.int64)
+    assigned = np.full(len(durations), -1, dtype=np.int64)
+    for jid in order:
+        best = compat_printers[compat_offsets[jid]]
+        for k in range(compat_offsets[jid] + 1, compat_offsets[jid + 1]):
+            if next_free[compat_printers[k]] < next_free[best]:
+                best = compat_printers[k]
+        if next_free[best] + durations[jid] > horizon:
+            continue
+        starts[jid] = next_free[best]
+        assigned[jid] = best
+        next_free[best] += durations[jid]
+    return starts, assigned
+
+def add_greedy_hint(model, jobs, printers, start_vars, end_vars, presence_literals,
+                    shift_start, horizon, job_buffer_minutes=0):
+    # Longest-processing-time-first warm start: each job, longest first, goes on the
+    # compatible printer that frees up earliest. Hints are advisory to CP-SAT, so
+    # jobs that would overrun the horizon are simply left unhinted.
+    printer_ids = list(printers)
+    printer_index = {pid: i for i, pid in enumerate(printer_ids)}
+    durations = np.array([job['duration'] + job_buffer_minutes for job in jobs], dtype=np.int64)
+    compat_offsets = np.zeros(len(jobs) + 1, dtype=np.int64)
+    compat_offsets[1:] = np.cumsum([len(presence_literals[jid]) for jid in range(len(jobs))])
+    compat_printers = np.array([printer_index[pid] for jid in range(len(jobs)) for pid in presence_literals[jid]],
+                               dtype=np.int64)
+    order = np.argsort(-durations, kind='stable')
+
+    starts, assigned = greedy_lpt(order, durations, compat_offsets, compat_printers, len(printer_ids),
+                                  shift_start, horizon)
+    for jid in order.tolist():
+        if assigned[jid] < 0:
+            continue
+        start, pid = int(starts[jid]), printer_ids[assigned[jid]]
+        model.AddHint(start_vars[jid], start)
+        model.AddHint(end_vars[jid], start + int(durations[jid]))
+        if len(presence_literals[jid]) > 1:
+            for other_pid, literal in presence_literals[jid].items():
+                model.AddHint(literal, other_pid == pid)
+
 def build_model(printers, jobs, objective_type="minimize_makespan_and_printers", user_parameters=None, debug=False):
     model = cp_model.CpModel()
     printer_rack = {pid: printers[pid]['rack'] for pid in printers}
     rack_to_id = {rack: i for i, rack in enumerate(set(printer_rack.values()))}
     printer_rack_id = {pid: rack_to_id[rack] for pid, rack in printer_rack.items()}
+    # Index printers by their stripped (material, technology, model) once, so each
+    # job finds its compatible printers with one dict lookup instead of a full scan
+    compat_index = {}
+    for pid, spec in printers.items():
+        key = (spec['material'].strip(), spec['technology'].strip(), spec['model'].strip())
+        compat_index.setdefault(key, []).append(pid)
+    # Rack partition of each compatible-printer list, shared by every job with that key
+    compat_racks = {}
+    for key, pids in compat_index.items():
+        for pid in pids:
+            compat_racks.setdefault(key, {}).setdefault(printer_rack_id[pid], []).append(pid)
     shift_start = user_parameters.get("shift_start", 480)  # 08:00 default
 
     shift_hours = user_parameters.get("shift_hours", 12)
     minutes_per_day = shift_hours * 60
 
     # === New Flexible Horizon Logic: Tailored per Material/Technology Type ===
-    work_per_type = {}
-    printers_per_type = {}
+    # Encode (material, technology) as small integer codes (job types first) and
+    # aggregate work and printer counts per code in compiled loops
+    type_codes = {}
+    job_types = np.array([type_codes.setdefault((job['required_material'], job['required_technology']), len(type_codes))
+                          for job in jobs], dtype=np.int16)
+    n_job_types = len(type_codes)
+    printer_types = np.array([type_codes.setdefault((spec['material'], spec['technology']), len(type_codes))
+                              for spec in printers.values()], dtype=np.int16)
+    durations = np.array([job['duration'] for job in jobs], dtype=np.int32)
 
     # Calculate estimated work per (material, technology) type for the current batch
-    for job in jobs:
-        mat_tech = (job['required_material'], job['required_technology'])
-        work_per_type[mat_tech] = work_per_type.get(mat_tech, 0) + job['duration']
-
+    work = aggregate_by_type(job_types, durations, len(type_codes))
     # Count printers per (material, technology) type
-    for pid, spec in printers.items():
-        mat_tech = (spec['material'], spec['technology'])
-        printers_per_type[mat_tech] = printers_per_type.get(mat_tech, 0) + 1
+    printer_counts = aggregate_by_type(printer_types, np.ones(len(printer_types), dtype=np.int32), len(type_codes))
+
+    mat_tech_types = list(type_codes)
+    work_per_type = {mat_tech_types[code]: int(work[code]) for code in range(n_job_types)}
+    printers_per_type = {mat_tech: int(printer_counts[code]) for mat_tech, code in type_codes.items() if printer_counts[code]}
 
     max_min_days_needed_per_type = 0.0
     for (material, technology), estimated_work_for_type in work_per_type.items():
@@ -127,12 +198,14 @@ def build_model(printers, jobs, objective_type="minimize_makespan_and_printers",
         print(f"\n--- DEBUG INFO for Batch (build_model) ---")
         print(f"DEBUG: Processing batch with {len(jobs)} jobs.")
 
-        fdm_petg_jobs = sum(1 for job in jobs if job['required_technology'] == 'FDM' and job['required_material'] == 'PETG')
-        fdm_pla_jobs = sum(1 for job in jobs if job['required_technology'] == 'FDM' and job['required_material'] == 'PLA')
-        lfam_petg_jobs = sum(1 for job in jobs if job['required_technology'] == 'LFAM' and job['required_material'] == 'PETG')
+        job_counts = aggregate_by_type(job_types, np.ones(len(job_types), dtype=np.int32), len(type_codes))
+        jobs_per_type = {mat_tech: int(job_counts[code]) for mat_tech, code in type_codes.items()}
+        fdm_petg_jobs = jobs_per_type.get(('PETG', 'FDM'), 0)
+        fdm_pla_jobs = jobs_per_type.get(('PLA', 'FDM'), 0)
+        lfam_petg_jobs = jobs_per_type.get(('PETG', 'LFAM'), 0)
         print(f"DEBUG: Job distribution in this batch: FDM (PETG): {fdm_petg_jobs}, FDM (PLA): {fdm_pla_jobs}, LFAM (PETG): {lfam_petg_jobs}")
         
-        print(f"📏 Estimated Work (Total for Batch): {sum(job['duration'] for job in jobs)} min")
+        print(f"📏 Estimated Work (Total for Batch): {int(durations.sum())} min")
         
         print(f"DEBUG: Work distribution by (material, technology): {work_per_type}")
         print(f"DEBUG: Printer distribution by (material, technology): {printers_per_type}")
@@ -147,92 +220,131 @@ def build_model(printers, jobs, objective_type="minimize_makespan_and_printers",
     if debug and job_buffer_minutes > 0:
         print(f"🛠️  Applying a buffer of {job_buffer_minutes} minutes between jobs.")
 
-    start_vars, end_vars, assigned_printer_vars, presence_literals, printer_intervals, rack_vars = define_job_variables(
-        model, jobs, printers, horizon, printer_rack_id, shift_start, job_buffer_minutes
-    )
-
-    add_no_overlap_constraints(model, printer_intervals)
-    printer_usage = add_printer_usage_variables(model, presence_literals, jobs, printers)
+    # Running every job back to back from shift start is always feasible, so no
+    # variable needs to reach past that point even when the day-based horizon does
+    serial_end = shift_start + sum(job['duration'] + job_buffer_minutes for job in jobs)
+    if serial_end < horizon:
+        horizon = serial_end
+        if debug:
+            print(f"DEBUG: Horizon capped at back-to-back schedule end: {horizon} min")
 
-    penalty = model.NewIntVar(0, 1000, "operator_penalty")
-    penalties = []
     diff = user_parameters.get("diff", 15)
     penalty_val = user_parameters.get("penalty_val", 10)
+    # Rack penalties only enter the composite objective, and only with a nonzero
+    # weight; otherwise neither the rack literals nor the pair loop are built
+    use_penalties = objective_type == "operator_aware_composite" and penalty_val > 0
 
-    jobs_sorted = sorted([(jid, jobs[jid]['duration']) for jid in range(len(jobs))], key=lambda x: x[1])
-
-    for idx_i in range(len(jobs_sorted)):
-        i, dur_i = jobs_sorted[idx_i]
-        for idx_j in range(idx_i + 1, min(idx_i + 20, len(jobs_sorted))):
-            j, dur_j = jobs_sorted[idx_j]
-            if abs(dur_i - dur_j) > 60:
-                break
-            if jobs[i]["required_technology"] != jobs[j]["required_technology"]:
-                continue
-
-            ei = end_vars[i]
-            ej = end_vars[j]
-            ri = rack_vars[i]
-            rj = rack_vars[j]
-
-            time_diff = model.NewIntVar(0, horizon, f"abs_diff_{i}_{j}")
-            model.AddAbsEquality(time_diff, ei - ej)
-
-            close_end = model.NewBoolVar(f"close_end_{i}_{j}")
-            model.Add(time_diff <= diff).OnlyEnforceIf(close_end)
-            model.Add(time_diff > diff).OnlyEnforceIf(close_end.Not())
+    start_vars, end_vars, presence_literals, printer_intervals, job_on_rack = define_job_variables(
+        model, jobs, printers, horizon, compat_index, compat_racks, shift_start, job_buffer_minutes,
+        track_racks=use_penalties
+    )
 
-            diff_rack = model.NewBoolVar(f"diff_rack_{i}_{j}")
-            model.Add(ri != rj).OnlyEnforceIf(diff_rack)
-            model.Add(ri == rj).OnlyEnforceIf(diff_rack.Not())
+    add_no_overlap_constraints(model, printer_intervals)
+    add_greedy_hint(model, jobs, printers, start_vars, end_vars, presence_literals,
+                    shift_start, horizon, job_buffer_minutes)
+    # Presence literals grouped per printer in one pass, for the per-printer job counts
+    by_printer = {pid: [] for pid in printers}
+    for job_literals in presence_literals.values():
+        for pid, literal in job_literals.items():
+            by_printer[pid].append(literal)
 
-            penalized = model.NewBoolVar(f"penalized_{i}_{j}")
-            model.AddBoolAnd([close_end, diff_rack]).OnlyEnforceIf(penalized)
-            penalties.append(penalized)
+    penalties = []
 
-    model.Add(penalty == sum(penalties))
+    # Pairs are neighbours in the global duration order (at most 19 places apart,
+    # within 60 min) that share a technology. Walking per-technology buckets of
+    # that order visits only those pairs instead of skipping cross-technology ones
+    candidate_pairs = []
+    if use_penalties:
+        jobs_sorted = sorted(range(len(jobs)), key=lambda jid: jobs[jid]['duration'])
+        by_tech = defaultdict(list)
+        for rank, jid in enumerate(jobs_sorted):
+            by_tech[jobs[jid]['required_technology']].append((rank, jid, jobs[jid]['duration']))
+
+        for tech_jobs in by_tech.values():
+            for idx_i, (rank_i, i, dur_i) in enumerate(tech_jobs):
+                for rank_j, j, dur_j in tech_jobs[idx_i + 1:]:
+                    if rank_j - rank_i >= 20 or dur_j - dur_i > 60:
+                        break
+                    candidate_pairs.append((i, j))
+
+    for i, j in candidate_pairs:
+        ei = end_vars[i]
+        ej = end_vars[j]
+        racks_i = job_on_rack[i]
+        racks_j = job_on_rack[j]
+
+        # |ei - ej| <= diff as two reified half-planes (no abs-diff IntVar)
+        ei_within = model.NewBoolVar(f"end_le_{i}_{j}")
+        model.Add(ei - ej <= diff).OnlyEnforceIf(ei_within)
+        model.Add(ei - ej > diff).OnlyEnforceIf(ei_within.Not())
+        ej_within = model.NewBoolVar(f"end_le_{j}_{i}")
+        model.Add(ej - ei <= diff).OnlyEnforceIf(ej_within)
+        model.Add(ej - ei > diff).OnlyEnforceIf(ej_within.Not())
+
+        close_end = model.NewBoolVar(f"close_end_{i}_{j}")
+        model.AddBoolAnd([ei_within, ej_within]).OnlyEnforceIf(close_end)
+        model.AddBoolOr([ei_within.Not(), ej_within.Not()]).OnlyEnforceIf(close_end.Not())
+
+        # diff_rack <=> no rack holds both jobs, as clauses over the rack literals
+        diff_rack = model.NewBoolVar(f"diff_rack_{i}_{j}")
+        for r, on_i in racks_i.items():
+            if r in racks_j:
+                model.AddBoolOr([on_i.Not(), racks_j[r].Not(), diff_rack.Not()])
+                model.AddBoolOr([on_i.Not(), racks_j[r], diff_rack])
+            else:
+                model.AddBoolOr([on_i.Not(), diff_rack])
+
+        penalized = model.NewBoolVar(f"penalized_{i}_{j}")
+        model.AddBoolAnd([close_end, diff_rack]).OnlyEnforceIf(penalized)
+        penalties.append(penalized)
+
+    # The objective weighs the penalty literals directly as a linear expression
+    penalty = LinearExpr.Sum(penalties)
 
     printer_job_counts = {}
     max_job_count = model.NewIntVar(0, len(jobs), "max_job_count")
     for pid in printers:
-        printer_assignments = [presence_literals[jid][pid] for jid in presence_literals if pid in presence_literals[jid]]
+        printer_assignments = by_printer[pid]
         count = model.NewIntVar(0, len(jobs), f"job_count_p{pid}")
-        model.Add(count == sum(printer_assignments))
+        model.Add(count == LinearExpr.Sum(printer_assignments))
         printer_job_counts[pid] = count
     model.AddMaxEquality(max_job_count, list(printer_job_counts.values()))
 
+    # Printer usage only enters the default objective
+    if objective_type != "operator_aware_composite":
+        printer_usage = add_printer_usage_variables(model, printer_job_counts)
+
     load_penalty_weight = 30
 
     # NOTE: end_vars from define_job_variables now includes the buffer time.
-    # To get the true makespan for the objective function, we must calculate it
-    # from the start time and the original, non-buffered job duration.
-    makespan = model.NewIntVar(0, horizon, 'makespan')
-    true_end_times = []
+    # The true makespan uses the original, non-buffered job duration; it is
+    # bounded below by every start + duration and minimized, so it is tight.
+    makespan = model.NewIntVar(max((shift_start + job['duration'] for job in jobs), default=0), horizon, 'makespan')
     for jid, job in enumerate(jobs):
-        true_end = model.NewIntVar(0, horizon, f"true_end_{jid}")
-        model.Add(true_end == start_vars[jid] + job['duration'])
-        true_end_times.append(true_end)
-
-    if not true_end_times: # Handle case where there are no jobs
-        model.Add(makespan == 0)
-    else:
-        model.AddMaxEquality(makespan, true_end_times)
+        model.Add(makespan >= start_vars[jid] + job['duration'])
 
     total_start_time = model.NewIntVar(0, horizon * len(jobs), "total_start_time")
-    model.Add(total_start_time == sum(start_vars.values()))
+    model.Add(total_start_time == LinearExpr.Sum(list(start_vars.values())))
 
     if objective_type == "operator_aware_composite":
-        model.Minimize(
-            makespan +
-            penalty_val * penalty +
-            load_penalty_weight * max_job_count +
-            1 * total_start_time
-        )
+        model.Minimize(LinearExpr.WeightedSum(
+            [makespan, penalty, max_job_count, total_start_time],
+            [1, penalty_val, load_penalty_weight, 1]
+        ))
     else:
         model.Minimize(
             makespan * (len(printer_usage) + 1) +
-            sum(printer_usage.values()) +
+            LinearExpr.Sum(list(printer_usage.values())) +
             total_start_time
         )
 
-    return model, start_vars, end_vars, assigned_printer_vars, penalty
\ No newline at end of file
+    # Search hint: commit jobs to printers first (which tightens each printer's
+    # NoOverlap), then place starts earliest-first. Single-printer jobs have no
+    # choice to branch on.
+    choice_literals = [literal for job_literals in presence_literals.values() if len(job_literals) > 1
+                       for literal in job_literals.values()]
+    if choice_literals:
+        model.AddDecisionStrategy(choice_literals, cp_model.CHOOSE_FIRST, cp_model.SELECT_MAX_VALUE)
+    model.AddDecisionStrategy(list(start_vars.values()), cp_model.CHOOSE_LOWEST_MIN, cp_model.SELECT_MIN_VALUE)
+
+    return model, start_vars, end_vars, presence_literals, penalties
\ No newline at end of file
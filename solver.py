@@ -1,11 +1,21 @@
 # In MES-Demo July.24/solver.py
 
 from ortools.sat.python import cp_model
+import numpy as np
 import pandas as pd
 
-def solve_and_extract(model, start_vars, end_vars, assigned_printer, jobs, printers, penalty_var=None):
+def solve_and_extract(model, start_vars, end_vars, presence_literals, jobs, printers, penalties=None, solver_params=None):
+    solver_params = solver_params or {}
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 100.0  # Time limit (from previous step)
+    solver.parameters.max_time_in_seconds = solver_params.get('max_time_in_seconds', 100.0)  # Time limit per batch
+    solver.parameters.log_search_progress = solver_params.get('log_search_progress', False)
+    if solver_params.get('num_search_workers'):
+        # Thread count per solve; 0/None keeps CP-SAT's default of using every core
+        solver.parameters.num_workers = solver_params['num_search_workers']
+    if solver_params.get('linearization_level') is not None:
+        # 2 adds the LP relaxation of every linear constraint; can pay off on the
+        # weighted composite objective, at the cost of slower search nodes
+        solver.parameters.linearization_level = solver_params['linearization_level']
 
     status = solver.Solve(model)
 
@@ -13,29 +23,31 @@ def solve_and_extract(model, start_vars, end_vars, assigned_printer, jobs, print
         print("❌ No solution found.")
         return pd.DataFrame()
 
-    results = []
-    for jid in range(len(jobs)):
-        job = jobs[jid]
-        results.append({
-            'job_id': job['job_id'],
-            'job_title': job['job_title'],
-            'start': solver.Value(start_vars[jid]),
-            'end': solver.Value(end_vars[jid]),
-            'duration': job['duration'],
-            'printer': solver.Value(assigned_printer[jid]),
-            'material': job['required_material'],
-            'technology': job['required_technology'],
-            'machine_model': job['machine_model'],
-            'alpha_quantity_on_plate': job['alpha_quantity_on_plate']
-        })
+    # Read every solved value once into per-column lists (times as compact int32)
+    starts = np.array([solver.Value(start_vars[jid]) for jid in range(len(jobs))], dtype=np.int32)
+    ends = np.array([solver.Value(end_vars[jid]) for jid in range(len(jobs))], dtype=np.int32)
+    # The assigned printer is the one whose presence literal is true
+    pids = [next(pid for pid, literal in presence_literals[jid].items() if solver.Value(literal))
+            for jid in range(len(jobs))]
+
+    results = pd.DataFrame({
+        'job_id': [job['job_id'] for job in jobs],
+        'job_title': [job['job_title'] for job in jobs],
+        'start': starts,
+        'end': ends,
+        'duration': np.array([job['duration'] for job in jobs], dtype=np.int32),
+        'printer': pids,
+        'material': [job['required_material'] for job in jobs],
+        'technology': [job['required_technology'] for job in jobs],
+        'machine_model': [job['machine_model'] for job in jobs],
+        'alpha_quantity_on_plate': [job['alpha_quantity_on_plate'] for job in jobs]
+    })
 
     # --- DEBUG: Printer Usage in Solution ---
     print("\n--- DEBUG: Printer Usage in Solution ---")
     used_printers_count = 0
     
-    printers_used_in_solution = set()
-    for jid in range(len(jobs)):
-        printers_used_in_solution.add(solver.Value(assigned_printer[jid]))
+    printers_used_in_solution = set(pids)
 
     for pid, printer_spec in printers.items():
         printer_name = printer_spec['name']
@@ -49,9 +61,9 @@ def solve_and_extract(model, start_vars, end_vars, assigned_printer, jobs, print
     print(f"Total Printers Used: {used_printers_count} out of {len(printers)}")
     
     # --- DEBUG: Location-based Penalty Value ---
-    if penalty_var is not None:
-        penalty_value_solved = solver.Value(penalty_var)
+    if penalties is not None:
+        penalty_value_solved = sum(solver.Value(p) for p in penalties)
         print(f"DEBUG: Location-based Penalty Value: {penalty_value_solved}")
     print("------------------------------------------") 
 
-    return pd.DataFrame(results)
\ No newline at end of file
+    return results
\ No newline at end of file